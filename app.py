@@ -3,10 +3,11 @@ import logging
 from flask import Flask, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import DeclarativeBase
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 class Base(DeclarativeBase):
@@ -15,42 +16,90 @@ class Base(DeclarativeBase):
 # Initialize SQLAlchemy with the base class
 db = SQLAlchemy(model_class=Base)
 
-# Initialize Flask app
-app = Flask(__name__, static_folder='../dist')
-app.secret_key = os.environ.get("SESSION_SECRET", "default-dev-key")
+def create_app():
+    """
+    Create and configure the Flask app
+    
+    The database schema is not created here; call init_db() explicitly.
+    
+    Returns:
+        Flask: The configured application
+    """
+    app = Flask(__name__, static_folder='../dist')
+    app.secret_key = os.environ.get("SESSION_SECRET", "default-dev-key")
+    
+    # Enable CORS
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    
+    # Configure the database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///crop_detection.db")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    
+    # Limit request body size (uploads larger than this are rejected with 413)
+    app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_UPLOAD_MB", "16")) * 1024 * 1024
+    
+    # Initialize the database with the app
+    db.init_app(app)
+    
+    # Import and register routes
+    from backend.routes import register_routes
+    register_routes(app)
+    
+    # Serve React App - all non-API routes will serve the React app
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if path != "" and os.path.exists(app.static_folder + '/' + path):
+            return send_from_directory(app.static_folder, path)
+        else:
+            return send_from_directory(app.static_folder, 'index.html')
+    
+    logger.debug("Application initialized")
+    
+    return app
 
-# Enable CORS
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+def init_db(app):
+    """
+    Create database tables for all registered models
+    
+    create_all() leaves existing tables alone, so columns added to a model
+    since its table was created are added here as well.
+    """
+    with app.app_context():
+        # Import models here to ensure they're registered with SQLAlchemy
+        from backend.models import Analysis
+        db.create_all()
+        _add_missing_columns(Analysis.__table__)
+        logger.debug("Database tables created")
 
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///crop_detection.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Initialize the database with the app
-db.init_app(app)
-
-# Create database tables within app context
-with app.app_context():
-    # Import models here to ensure they're registered with SQLAlchemy
-    from backend.models import Analysis
-    db.create_all()
-    logger.debug("Database tables created")
-
-# Import and register routes
-from backend.routes import register_routes
-register_routes(app)
-
-# Serve React App - all non-API routes will serve the React app
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    if path != "" and os.path.exists(app.static_folder + '/' + path):
-        return send_from_directory(app.static_folder, path)
-    else:
-        return send_from_directory(app.static_folder, 'index.html')
-
-logger.debug("Application initialized")
+def _add_missing_columns(table):
+    """
+    Add model columns that are missing from an existing table
+    
+    Only nullable columns are added, which covers every column introduced
+    after the original schema; their indexes are created alongside them.
+    
+    Args:
+        table: SQLAlchemy Table of a registered model
+    """
+    existing = {column["name"] for column in inspect(db.engine).get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in existing]
+    if not missing:
+        return
+    
+    preparer = db.engine.dialect.identifier_preparer
+    with db.engine.begin() as connection:
+        for column in missing:
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            connection.execute(text(
+                f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+            ))
+            logger.info(f"Added column {table.name}.{column.name}")
+        
+        for index in table.indexes:
+            if any(column in missing for column in index.columns):
+                index.create(connection, checkfirst=True)
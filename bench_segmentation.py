@@ -0,0 +1,55 @@
+"""
+Benchmark the Felzenszwalb and Fuzzy C-means segmentation backends
+
+Usage:
+    python -m backend.bench_segmentation [--sizes 256 512 1024] [--repeat 3]
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from backend.image_processing import ImageProcessor
+from backend.segmentation import get_fcm
+
+def make_leaf_image(size, seed=0):
+    """Create a synthetic green leaf image with darker brown lesions"""
+    rng = np.random.default_rng(seed)
+    image = np.empty((size, size, 3), dtype=np.uint8)
+    image[:] = (40, 150, 60)
+    noise = rng.normal(0, 12, image.shape)
+    yy, xx = np.mgrid[:size, :size]
+    for _ in range(max(4, size // 32)):
+        cy, cx = rng.integers(0, size, 2)
+        radius = rng.integers(size // 64 + 2, size // 16 + 4)
+        image[(yy - cy) ** 2 + (xx - cx) ** 2 < radius ** 2] = (30, 60, 110)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+def run(image, method, repeat):
+    """Return (best seconds, peak traced MiB) for one backend"""
+    timings = []
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        ImageProcessor.preprocess_image(image, render_overlay=False, segmentation_method=method)
+        timings.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return min(timings), peak / (1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 512, 1024])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'method':>13} {'seconds':>9} {'peak MiB':>9}")
+    for size in args.sizes:
+        image = make_leaf_image(size)
+        for method in ('felzenszwalb', 'fcm'):
+            seconds, peak = run(image, method, args.repeat)
+            print(f"{size:>6} {method:>13} {seconds:>9.3f} {peak:>9.1f}")
+        print(f"{'':>6} {'fcm iters':>13} {get_fcm().n_iter:>9} (warm start)")
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,61 @@
-import cv2
 import numpy as np
 import logging
 import os
 import base64
 from io import BytesIO
-from skimage.filters import median
-from skimage.segmentation import felzenszwalb
-from skimage import color
+from backend.segmentation import get_fcm, FCM_MIN_INTENSITY_SPREAD
 
 logger = logging.getLogger(__name__)
 
+# Segmentation backend used by preprocess_image: 'felzenszwalb' or 'fcm'
+SEGMENTATION_METHOD = os.environ.get("SEGMENTATION_METHOD", "felzenszwalb")
+
+# FCM disease cluster selection, on intensities scaled to 0-1
+FCM_DARK_MARGIN = 0.5  # Darkest centroid's gap to the next, as a share of the spread
+
+# Lookup table for darkening disease areas; matches uint8(value * 0.7)
+DARKEN_LUT = (np.arange(256) * 0.7).astype(np.uint8)
+
+# Region analysis settings
+MIN_LESION_AREA = 5  # Components smaller than this (in pixels) are treated as noise
+MAX_REPORTED_REGIONS = 500  # Only the largest lesions are listed individually
+LEAF_SATURATION_THRESHOLD = 25  # Pixels below this HSV saturation count as background
+
+# Lookup tables for the circular mean of OpenCV hue (0-179, 2 degrees per step)
+HUE_COS_LUT = np.cos(np.arange(180) * (np.pi / 90.0))
+HUE_SIN_LUT = np.sin(np.arange(180) * (np.pi / 90.0))
+
 class ImageProcessor:
     """
     Handles image preprocessing for crop disease detection
+    
+    OpenCV and scikit-image are imported inside the methods that use them so
+    that importing this module stays cheap.
     """
     
     @staticmethod
-    def preprocess_image(image):
+    def preprocess_image(image, render_overlay=True, segmentation_method=None):
         """
         Perform preprocessing steps on input image
         
         Args:
             image: Input image as numpy array
+            render_overlay: If False, skip rendering the highlighted image and
+                return only the mask and contours
+            segmentation_method: 'felzenszwalb' or 'fcm'; defaults to
+                SEGMENTATION_METHOD
             
         Returns:
             dict: Preprocessed image and processing details
         """
+        import cv2
+        from skimage.filters import median
+        
         try:
             logger.debug("Starting image preprocessing")
             
-            # Store original image
-            original = image.copy()
+            if segmentation_method is None:
+                segmentation_method = SEGMENTATION_METHOD
             
             # 1. Channel separation
             b, g, r = cv2.split(image)
@@ -44,35 +69,29 @@ class ImageProcessor:
             # 4. Create RGB denoised image for further processing
             denoised_rgb = cv2.cvtColor(denoised.astype(np.uint8), cv2.COLOR_GRAY2RGB)
             
-            # 5. Segmentation using Fuzzy C-means (FCM)
-            # For simplicity, we'll use Felzenszwalb segmentation as an approximation
-            segmented = felzenszwalb(denoised_rgb, scale=100, sigma=0.5, min_size=50)
+            # 5. Segmentation (highlight the likely disease areas)
+            if segmentation_method == 'fcm':
+                mask = ImageProcessor._segment_fcm(image, denoised)
+            elif segmentation_method == 'felzenszwalb':
+                mask = ImageProcessor._segment_felzenszwalb(denoised_rgb)
+            else:
+                raise ValueError(f"Unknown segmentation method: {segmentation_method}")
             
-            # Create segmentation mask (highlight the likely disease areas)
-            # This is a simplified approach - real FCM would be more complex
-            mask = np.zeros_like(grayscale)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            
+            # 6. Per-lesion region analysis
+            regions = ImageProcessor.analyze_regions(image, mask)
             
-            # Highlight darker regions as potential disease areas
-            # This is a heuristic approach and can be improved with actual FCM implementation
-            for segment_id in np.unique(segmented):
-                segment_mask = segmented == segment_id
-                segment_mean = np.mean(denoised_rgb[segment_mask])
+            result = None
+            if render_overlay:
+                # Darken disease areas in a single output buffer using the
+                # uint8 lookup table, applied to all channels at once
+                result = image.copy()
+                disease_area = mask > 0
+                result[disease_area] = DARKEN_LUT[result[disease_area]]
                 
-                # If segment is darker than average, consider it a potential disease area
-                if segment_mean < np.mean(denoised_rgb):
-                    mask[segmented == segment_id] = 255
-            
-            # Create final processed image by masking the original
-            masked_image = original.copy()
-            for i in range(3):  # Apply to each channel
-                channel = masked_image[:,:,i]
-                channel[mask > 0] = channel[mask > 0] * 0.7  # Darken disease areas
-                masked_image[:,:,i] = channel
-            
-            # Highlight potential disease spots with a green boundary
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            result = masked_image.copy()
-            cv2.drawContours(result, contours, -1, (0, 255, 0), 2)
+                # Highlight potential disease spots with a green boundary
+                cv2.drawContours(result, contours, -1, (0, 255, 0), 2)
             
             logger.debug("Image preprocessing completed")
             
@@ -81,17 +100,150 @@ class ImageProcessor:
                 "processed_image": result,
                 "grayscale": grayscale,
                 "mask": mask,
+                "contours": contours,
+                "regions": regions,
                 "processing_details": {
                     "channel_separation": "RGB channels separated",
                     "grayscale_conversion": "Converted to grayscale",
                     "noise_removal": "Median filtering applied",
-                    "segmentation": f"Identified {len(contours)} potential disease regions",
+                    "segmentation": f"Identified {regions['lesion_count']} potential disease regions",
+                    "segmentation_method": segmentation_method,
+                    "region_analysis": (f"{regions['lesion_count']} lesions covering "
+                                        f"{regions['affected_area_percent']:.2f}% of leaf area"),
                 }
             }
         except Exception as e:
             logger.error(f"Error during image preprocessing: {e}")
             raise
     
+    @staticmethod
+    def analyze_regions(image, mask, min_area=MIN_LESION_AREA, max_regions=MAX_REPORTED_REGIONS):
+        """
+        Measure each connected lesion in the disease mask in a single pass
+        
+        Area, bounding box and centroid come from connectedComponentsWithStats;
+        mean HSV color per lesion is accumulated with np.bincount over the label
+        image, so the cost does not grow with a Python loop per lesion.
+        
+        Args:
+            image: Original BGR image
+            mask: uint8 disease mask (non-zero for disease areas)
+            min_area: Smallest lesion area in pixels to report
+            max_regions: Maximum number of lesions listed, largest first
+            
+        Returns:
+            dict: Lesion summary and per-lesion features stored column-wise
+        """
+        import cv2
+        
+        n_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
+            (mask > 0).view(np.uint8), connectivity=8
+        )
+        
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        hue, saturation, value = hsv[:, :, 0].ravel(), hsv[:, :, 1].ravel(), hsv[:, :, 2].ravel()
+        flat_labels = labels.ravel()
+        
+        # Per-label sums in one pass each; label 0 is the background
+        counts = np.maximum(np.bincount(flat_labels, minlength=n_labels), 1)
+        hue_cos = np.bincount(flat_labels, weights=HUE_COS_LUT[hue], minlength=n_labels)
+        hue_sin = np.bincount(flat_labels, weights=HUE_SIN_LUT[hue], minlength=n_labels)
+        mean_hue = (np.degrees(np.arctan2(hue_sin, hue_cos)) % 360.0) / 2.0
+        mean_saturation = np.bincount(flat_labels, weights=saturation, minlength=n_labels) / counts
+        mean_value = np.bincount(flat_labels, weights=value, minlength=n_labels) / counts
+        
+        # Keep lesions above the noise threshold, largest first
+        areas = stats[:, cv2.CC_STAT_AREA]
+        lesion_ids = np.flatnonzero(areas >= min_area)
+        lesion_ids = lesion_ids[lesion_ids != 0]
+        lesion_ids = lesion_ids[np.argsort(areas[lesion_ids], kind='stable')[::-1]]
+        reported = lesion_ids[:max_regions]
+        
+        # Affected share of the leaf, excluding low-saturation background
+        lesion_area = int(areas[lesion_ids].sum())
+        leaf_area = int(np.count_nonzero((saturation >= LEAF_SATURATION_THRESHOLD) | (flat_labels > 0)))
+        affected_area_percent = 100.0 * lesion_area / leaf_area if leaf_area else 0.0
+        
+        return {
+            "lesion_count": int(len(lesion_ids)),
+            "lesion_area": lesion_area,
+            "leaf_area": leaf_area,
+            "affected_area_percent": round(affected_area_percent, 2),
+            "truncated": bool(len(lesion_ids) > len(reported)),
+            "regions": {
+                "area": areas[reported].tolist(),
+                "bbox": stats[reported, :4].tolist(),  # x, y, width, height
+                "centroid": np.round(centroids[reported], 1).tolist(),
+                "mean_hsv": np.round(
+                    np.column_stack([mean_hue[reported], mean_saturation[reported], mean_value[reported]]), 1
+                ).tolist(),
+            }
+        }
+    
+    @staticmethod
+    def _segment_felzenszwalb(denoised_rgb):
+        """
+        Build the disease mask from a Felzenszwalb over-segmentation
+        
+        Args:
+            denoised_rgb: Denoised grayscale image replicated to 3 channels
+            
+        Returns:
+            numpy.ndarray: uint8 mask with disease areas set to 255
+        """
+        from skimage.segmentation import felzenszwalb
+        
+        segmented = felzenszwalb(denoised_rgb, scale=100, sigma=0.5, min_size=50)
+        
+        mask = np.zeros(segmented.shape, dtype=np.uint8)
+        
+        # Highlight darker regions as potential disease areas
+        for segment_id in np.unique(segmented):
+            segment_mask = segmented == segment_id
+            segment_mean = np.mean(denoised_rgb[segment_mask])
+            
+            # If segment is darker than average, consider it a potential disease area
+            if segment_mean < np.mean(denoised_rgb):
+                mask[segmented == segment_id] = 255
+        
+        return mask
+    
+    @staticmethod
+    def _segment_fcm(image, denoised):
+        """
+        Build the disease mask with Fuzzy C-means clustering of pixel features
+        
+        Args:
+            image: Original BGR image
+            denoised: Denoised grayscale image
+            
+        Returns:
+            numpy.ndarray: uint8 mask with disease areas set to 255
+        """
+        import cv2
+        
+        # Per-pixel features: denoised intensity plus the a*/b* chroma of the original
+        lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+        lab[:, :, 0] = denoised
+        features = lab.reshape(-1, 3).astype(np.float32)
+        features *= 1.0 / 255.0
+        
+        labels, centroids = get_fcm().fit_predict(features)
+        
+        # Centroids are ordered by intensity. Only the darkest cluster is a
+        # potential disease area, and only when it stands clearly apart: the
+        # intensity spread must exceed FCM_MIN_INTENSITY_SPREAD, and the gap to
+        # the next cluster must be at least FCM_DARK_MARGIN of that spread.
+        # Uniform or noisy lesion-free leaves give near-coincident centroids.
+        intensities = centroids[:, 0]
+        spread = intensities[-1] - intensities[0]
+        if spread < FCM_MIN_INTENSITY_SPREAD or intensities[1] - intensities[0] < FCM_DARK_MARGIN * spread:
+            return np.zeros(denoised.shape, dtype=np.uint8)
+        
+        mask = np.where(labels == 0, 255, 0).astype(np.uint8)
+        
+        return mask.reshape(denoised.shape)
+    
     @staticmethod
     def image_to_base64(image):
         """
@@ -103,6 +255,8 @@ class ImageProcessor:
         Returns:
             str: Base64 encoded image string
         """
+        import cv2
+        
         try:
             # Encode image as JPEG
             _, buffer = cv2.imencode('.jpg', image)
@@ -126,6 +280,8 @@ class ImageProcessor:
         Returns:
             numpy.ndarray: Image array
         """
+        import cv2
+        
         try:
             # Remove data URL prefix if present
             if ',' in base64_str:
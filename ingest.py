@@ -0,0 +1,295 @@
+"""
+Bulk offline scoring of a directory of images
+
+Scans (or watches) a directory, runs every image through ImageProcessor and
+CropDiseaseModel on a multiprocessing pool and writes the Analysis rows in
+batches. Processed paths are appended to a checkpoint file after each batch
+is committed, so an interrupted run resumes where it stopped. Checkpoint
+entries are keyed by crop and segmentation method, so rerunning a directory
+with different settings scores every image again.
+
+Usage:
+    python -m backend.ingest /data/field_station [--watch] [--workers 8]
+"""
+import os
+import sys
+import time
+import json
+import logging
+import argparse
+from multiprocessing import Pool
+
+logger = logging.getLogger(__name__)
+
+# Constants
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+CHECKPOINT_FILENAME = '.ingest_checkpoint'
+SETTLE_SECONDS = 2.0
+
+# Segmentation backend and crop for this worker process, set by _init_worker
+_segmentation_method = None
+_crop = None
+
+def find_images(directory, recursive=True):
+    """
+    List image files under a directory in a stable order
+
+    Args:
+        directory: Directory to scan
+        recursive: Whether to descend into subdirectories
+
+    Returns:
+        list: Absolute image paths
+    """
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.abspath(os.path.join(root, name)))
+        if not recursive:
+            break
+    return sorted(paths)
+
+def checkpoint_key(crop, segmentation_method):
+    """Identify the settings a checkpoint entry was scored with"""
+    return f"{crop}:{segmentation_method}"
+
+def load_checkpoint(checkpoint_path, key):
+    """Return the set of image paths recorded as done with the given settings"""
+    if not os.path.exists(checkpoint_path):
+        return set()
+    done = set()
+    with open(checkpoint_path) as f:
+        for line in f:
+            entry_key, _, path = line.rstrip('\n').partition('\t')
+            if path and entry_key == key:
+                done.add(path)
+    return done
+
+def append_checkpoint(checkpoint_path, key, paths):
+    """Record a committed batch of image paths as done with the given settings"""
+    with open(checkpoint_path, 'a') as f:
+        f.writelines(f"{key}\t{path}\n" for path in paths)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _init_worker(segmentation_method, crop):
+    """Make sure the model is loaded once per worker process"""
+    global _segmentation_method, _crop
+    _segmentation_method = segmentation_method
+    _crop = crop
+
+    from backend.ml_model import get_model
+    get_model(crop)
+
+def score_image(path):
+    """
+    Process and classify a single image inside a worker
+
+    Args:
+        path: Path to the image file
+
+    Returns:
+        tuple: (path, Analysis field dict or None, error message or None)
+    """
+    import cv2
+    from backend.ml_model import get_model, serialize_probabilities
+    from backend.image_processing import ImageProcessor
+    from backend.routes import PROCESSED_FOLDER
+    from backend.utils import generate_unique_filename
+
+    try:
+        image = cv2.imread(path)
+        if image is None:
+            return path, None, "Failed to read image file"
+
+        processed_data = ImageProcessor.preprocess_image(image, segmentation_method=_segmentation_method)
+        processed_image = processed_data["processed_image"]
+        regions = processed_data["regions"]
+
+        filename = os.path.basename(path)
+        processed_path = os.path.join(PROCESSED_FOLDER, f"processed_{generate_unique_filename(filename)}")
+        cv2.imwrite(processed_path, processed_image)
+
+        model = get_model(_crop)
+        features = model.extract_features(processed_image)
+        prediction = model.predict_with_uncertainty(features)
+
+        return path, {
+            "filename": filename,
+            "original_image_path": path,
+            "processed_image_path": processed_path,
+            "crop": _crop,
+            "disease_class": prediction["disease_class"],
+            "confidence": prediction["confidence"],
+            "probabilities": serialize_probabilities(prediction["probabilities"]),
+            "uncertainty": prediction["uncertainty"],
+            "uncertainty_method": prediction["uncertainty_method"],
+            "lesion_count": regions["lesion_count"],
+            "affected_area_percent": regions["affected_area_percent"],
+            "features": json.dumps(features.tolist()),
+            "preprocessing_details": json.dumps(processed_data["processing_details"]),
+            "regions": json.dumps(regions, separators=(',', ':'))
+        }, None
+    except Exception as e:
+        return path, None, str(e)
+
+class Ingestor:
+    """
+    Streams image paths through a worker pool and bulk-inserts the results
+    """
+
+    def __init__(self, pool, checkpoint_path, checkpoint_key, batch_size=100, chunksize=4):
+        """Initialize the ingestor around an open worker pool"""
+        self.pool = pool
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_key = checkpoint_key
+        self.batch_size = batch_size
+        self.chunksize = chunksize
+        self.done = load_checkpoint(checkpoint_path, checkpoint_key)
+        self.failed = set()
+        self.processed = 0
+        self.elapsed = 0.0  # Time spent inside run(), excluding idle polling
+        self._run_started = None
+
+    def pending(self, paths):
+        """Filter out paths already done or failed in this run"""
+        return [path for path in paths if path not in self.done and path not in self.failed]
+
+    def _flush(self, rows, paths):
+        """Insert a batch of rows in one transaction, then checkpoint it"""
+        from backend.app import db
+        from backend.models import Analysis
+
+        if rows:
+            db.session.add_all([Analysis(**row) for row in rows])
+            db.session.commit()
+        append_checkpoint(self.checkpoint_path, self.checkpoint_key, paths)
+        self.done.update(paths)
+
+    def run(self, paths):
+        """
+        Score a list of image paths
+
+        Args:
+            paths: Image paths to process
+
+        Returns:
+            int: Number of images successfully scored
+        """
+        rows, batch_paths = [], []
+        scored = 0
+        self._run_started = time.perf_counter()
+
+        try:
+            for path, row, error in self.pool.imap_unordered(score_image, paths, chunksize=self.chunksize):
+                if error:
+                    logger.error(f"Error processing {path}: {error}")
+                    self.failed.add(path)
+                    continue
+
+                rows.append(row)
+                batch_paths.append(path)
+                scored += 1
+
+                if len(rows) >= self.batch_size:
+                    self._flush(rows, batch_paths)
+                    self.processed += len(rows)
+                    rows, batch_paths = [], []
+                    self.report()
+
+            if rows:
+                self._flush(rows, batch_paths)
+                self.processed += len(rows)
+                self.report()
+        finally:
+            self.elapsed += time.perf_counter() - self._run_started
+            self._run_started = None
+
+        return scored
+
+    def report(self):
+        """Log throughput over the time spent scoring, excluding idle polling"""
+        elapsed = self.elapsed
+        if self._run_started is not None:
+            elapsed += time.perf_counter() - self._run_started
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        logger.info(f"{self.processed} images scored in {elapsed:.1f}s ({rate:.2f} images/sec)")
+
+def settled(paths, settle_seconds=SETTLE_SECONDS):
+    """Drop files modified too recently to be completely written"""
+    now = time.time()
+    result = []
+    for path in paths:
+        try:
+            if now - os.path.getmtime(path) >= settle_seconds:
+                result.append(path)
+        except OSError:
+            continue
+    return result
+
+def main(argv=None):
+    from backend.ml_model import CROP_CLASSES, DEFAULT_CROP
+
+    parser = argparse.ArgumentParser(description="Score a directory of crop images without the HTTP server")
+    parser.add_argument('directory', help="Directory containing images")
+    parser.add_argument('--watch', action='store_true', help="Keep polling the directory for new images")
+    parser.add_argument('--interval', type=float, default=10.0, help="Polling interval in seconds when watching")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--batch-size', type=int, default=100, help="Rows per database transaction")
+    parser.add_argument('--crop', choices=list(CROP_CLASSES), default=DEFAULT_CROP,
+                        help="Crop whose model scores the images")
+    parser.add_argument('--segmentation', choices=['felzenszwalb', 'fcm'], default=None,
+                        help="Segmentation backend (defaults to SEGMENTATION_METHOD)")
+    parser.add_argument('--checkpoint', default=None,
+                        help=f"Checkpoint file (defaults to <directory>/{CHECKPOINT_FILENAME})")
+    parser.add_argument('--no-recursive', action='store_true', help="Do not descend into subdirectories")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"Not a directory: {args.directory}")
+
+    checkpoint_path = args.checkpoint or os.path.join(args.directory, CHECKPOINT_FILENAME)
+
+    from backend.app import create_app, init_db
+    from backend.ml_model import preload_models
+    from backend.image_processing import SEGMENTATION_METHOD
+
+    segmentation_method = args.segmentation or SEGMENTATION_METHOD
+
+    app = create_app()
+    init_db(app)
+
+    # Load and pin the model before forking so the workers share it
+    preload_models([args.crop])
+
+    with app.app_context(), Pool(args.workers, initializer=_init_worker, initargs=(segmentation_method, args.crop)) as pool:
+        key = checkpoint_key(args.crop, segmentation_method)
+        ingestor = Ingestor(pool, checkpoint_path, key, batch_size=args.batch_size)
+        logger.info(f"Resuming with {len(ingestor.done)} images already done for {key}" if ingestor.done
+                    else f"Starting new ingestion run for {key}")
+
+        try:
+            while True:
+                paths = ingestor.pending(find_images(args.directory, recursive=not args.no_recursive))
+                if args.watch:
+                    paths = settled(paths)
+                if paths:
+                    logger.info(f"Found {len(paths)} new images")
+                    ingestor.run(paths)
+                if not args.watch:
+                    break
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            logger.info("Interrupted; progress is checkpointed and will resume on the next run")
+
+        ingestor.report()
+        if ingestor.failed:
+            logger.warning(f"{len(ingestor.failed)} images failed")
+
+    return 1 if ingestor.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
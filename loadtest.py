@@ -0,0 +1,154 @@
+"""
+Load test for the crop detection API
+
+Starts the production server with each requested worker count, waits until
+/api/ready reports ready, then drives concurrent uploads against it and
+prints requests/sec so the scaling with worker count can be compared.
+
+Servers started here write to a throwaway SQLite database and image folders
+in a temporary directory, which is deleted afterwards. Pass --database-url
+to use another disposable database instead; it is left in place.
+
+Usage:
+    python -m backend.loadtest --workers 1 2 4 [--concurrency 16] [--requests 200]
+    python -m backend.loadtest --url http://host:5000 [--endpoint /api/health]
+"""
+import os
+import sys
+import time
+import uuid
+import shutil
+import tempfile
+import argparse
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+def make_upload_body(image_bytes, filename='leaf.jpg'):
+    """
+    Build a multipart/form-data body for /api/upload
+
+    Returns:
+        tuple: (body bytes, content type header)
+    """
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + image_bytes + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def default_image_bytes(size):
+    """Encode a synthetic leaf image as JPEG"""
+    import cv2
+    from backend.bench_segmentation import make_leaf_image
+
+    _, buffer = cv2.imencode('.jpg', make_leaf_image(size))
+    return buffer.tobytes()
+
+def wait_until_ready(base_url, timeout=120):
+    """Poll /api/ready until the server reports ready"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/ready", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout}s")
+
+def run_load(base_url, endpoint, total, concurrency, body=None, content_type=None):
+    """
+    Send requests concurrently and measure throughput
+
+    Returns:
+        tuple: (requests/sec, number of failed requests)
+    """
+    def send(_):
+        request = urllib.request.Request(f"{base_url}{endpoint}", data=body,
+                                         headers={"Content-Type": content_type} if content_type else {})
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                response.read()
+                return response.status == 200
+        except OSError:
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(send, range(total)))
+    elapsed = time.perf_counter() - started
+
+    return total / elapsed, results.count(False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure API requests/sec against worker count")
+    parser.add_argument('--url', help="Test an already running server instead of starting one")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                        help="Worker counts to start the server with")
+    parser.add_argument('--threads', type=int, default=1, help="Threads per worker")
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--endpoint', default='/api/upload')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--image', help="Image to upload (defaults to a synthetic leaf)")
+    parser.add_argument('--image-size', type=int, default=512)
+    parser.add_argument('--database-url',
+                        help="Disposable database for started servers (defaults to a temporary SQLite file)")
+    args = parser.parse_args(argv)
+
+    body = content_type = None
+    if args.endpoint == '/api/upload':
+        if args.image:
+            with open(args.image, 'rb') as f:
+                image_bytes = f.read()
+        else:
+            image_bytes = default_image_bytes(args.image_size)
+        body, content_type = make_upload_body(image_bytes)
+
+    if args.url:
+        targets = [(None, args.url.rstrip('/'))]
+    else:
+        targets = [(workers, f"http://127.0.0.1:{args.port}") for workers in args.workers]
+
+    # Keep the rows and images written by started servers out of the real
+    # database and image folders
+    scratch_dir = tempfile.mkdtemp(prefix='loadtest_')
+    server_env = {
+        **os.environ,
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(scratch_dir, 'loadtest.db')}",
+        "UPLOAD_FOLDER": os.path.join(scratch_dir, 'uploads'),
+        "PROCESSED_FOLDER": os.path.join(scratch_dir, 'processed'),
+    }
+    
+    print(f"{'workers':>8} {'threads':>8} {'req/s':>9} {'failed':>7}")
+    try:
+        for workers, base_url in targets:
+            server = None
+            if workers is not None:
+                server = subprocess.Popen(
+                    [sys.executable, '-m', 'backend.serve', '--host', '127.0.0.1', '--port', str(args.port),
+                     '--workers', str(workers), '--threads', str(args.threads), '--max-requests', '0'],
+                    env=server_env,
+                )
+            try:
+                wait_until_ready(base_url)
+                # Warm up every worker before measuring
+                run_load(base_url, args.endpoint, args.concurrency, args.concurrency, body, content_type)
+                rate, failed = run_load(base_url, args.endpoint, args.requests, args.concurrency, body, content_type)
+                print(f"{workers or '-':>8} {args.threads:>8} {rate:>9.1f} {failed:>7}")
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,7 @@
-from backend.app import app
+from backend.app import create_app, init_db
+
+app = create_app()
+init_db(app)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
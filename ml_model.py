@@ -1,42 +1,101 @@
 import os
+import json
+import time
+import threading
 import numpy as np
-import cv2
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.decomposition import PCA
-import joblib
 import logging
+from collections import OrderedDict
+from concurrent.futures import Future
 
 logger = logging.getLogger(__name__)
 
 # Constants
 IMG_HEIGHT = 224
 IMG_WIDTH = 224
-CLASSES = ['Bacterial Leaf Blight', 'Brown Spot', 'Leaf Smut']
 MODEL_DIRECTORY = os.path.join(os.path.dirname(__file__), 'saved_models')
-ML_MODEL_PATH = os.path.join(MODEL_DIRECTORY, 'classifier_model.pkl')
-PCA_MODEL_PATH = os.path.join(MODEL_DIRECTORY, 'pca_model.pkl')
+ML_MODEL_FILENAME = 'classifier_model.pkl'
+PCA_MODEL_FILENAME = 'pca_model.pkl'
 
-os.makedirs(MODEL_DIRECTORY, exist_ok=True)
+# Classes predicted by each crop's model
+NUTRIENT_DEFICIENCY_CLASSES = [
+    'Healthy',
+    'Nitrogen Deficiency',
+    'Phosphorus Deficiency',
+    'Potassium Deficiency',
+    'Magnesium Deficiency',
+    'Iron Deficiency',
+    'Zinc Deficiency',
+]
+CROP_CLASSES = {
+    'rice': ['Bacterial Leaf Blight', 'Brown Spot', 'Leaf Smut'],
+    'rice_nutrient': NUTRIENT_DEFICIENCY_CLASSES,
+    'maize': NUTRIENT_DEFICIENCY_CLASSES,
+    'wheat': NUTRIENT_DEFICIENCY_CLASSES,
+    'tomato': NUTRIENT_DEFICIENCY_CLASSES,
+}
+DEFAULT_CROP = 'rice'
+CLASSES = CROP_CLASSES[DEFAULT_CROP]
+
+# Bounds on the models kept in memory by the ModelRouter
+MAX_LOADED_MODELS = int(os.environ.get("MAX_LOADED_MODELS", "4"))
+MODEL_IDLE_SECONDS = float(os.environ.get("MODEL_IDLE_SECONDS", "1800"))
+
+# Prediction output and human review thresholds
+TOP_K = 3
+REVIEW_CONFIDENCE_THRESHOLD = float(os.environ.get("REVIEW_CONFIDENCE_THRESHOLD", "0.6"))
+REVIEW_UNCERTAINTY_THRESHOLD = float(os.environ.get("REVIEW_UNCERTAINTY_THRESHOLD", "0.5"))
+REVIEW_ENTROPY_THRESHOLD = float(os.environ.get("REVIEW_ENTROPY_THRESHOLD", "0.9"))
+
+# Uncertainty measures reported by predict_with_uncertainty, with their review thresholds
+UNCERTAINTY_VOTE_DISAGREEMENT = 'vote_disagreement'
+UNCERTAINTY_ENTROPY = 'entropy'
+REVIEW_UNCERTAINTY_THRESHOLDS = {
+    UNCERTAINTY_VOTE_DISAGREEMENT: REVIEW_UNCERTAINTY_THRESHOLD,
+    UNCERTAINTY_ENTROPY: REVIEW_ENTROPY_THRESHOLD,
+}
 
 class CropDiseaseModel:
     """
     A class for detecting nutritional deficiencies and diseases in crop images
     using PCA for feature extraction and RandomForest for classification.
+    
+    OpenCV, scikit-learn and joblib are imported inside the methods that use
+    them, so importing this module does not load the ML stack.
     """
     
-    def __init__(self):
-        """Initialize the model components"""
+    def __init__(self, crop=DEFAULT_CROP):
+        """
+        Initialize the model components for a crop
+        
+        Args:
+            crop: Crop name, one of CROP_CLASSES
+        """
+        if crop not in CROP_CLASSES:
+            raise ValueError(f"Unsupported crop: {crop}")
+        
+        self.crop = crop
+        self.classes = CROP_CLASSES[crop]
+        self.model_directory = os.path.join(MODEL_DIRECTORY, crop)
+        self.ml_model_path = os.path.join(self.model_directory, ML_MODEL_FILENAME)
+        self.pca_model_path = os.path.join(self.model_directory, PCA_MODEL_FILENAME)
         self.pca = None
         self.classifier = None
+        self.class_indices = None
         self.load_or_create_models()
     
     def load_or_create_models(self):
         """Load existing models or create new ones if they don't exist"""
+        import joblib
+        
+        os.makedirs(self.model_directory, exist_ok=True)
+        if self.crop == DEFAULT_CROP:
+            self._migrate_legacy_models()
+        
         # Setup PCA feature extractor
         try:
-            if os.path.exists(PCA_MODEL_PATH):
-                logger.info("Loading existing PCA model")
-                self.pca = joblib.load(PCA_MODEL_PATH)
+            if os.path.exists(self.pca_model_path):
+                logger.info(f"Loading existing PCA model for {self.crop}")
+                self.pca = joblib.load(self.pca_model_path)
             else:
                 logger.info("Creating new PCA model")
                 self._create_pca()
@@ -47,9 +106,9 @@ class CropDiseaseModel:
             
         # Setup classifier
         try:
-            if os.path.exists(ML_MODEL_PATH):
-                logger.info("Loading existing classifier model")
-                self.classifier = joblib.load(ML_MODEL_PATH)
+            if os.path.exists(self.ml_model_path):
+                logger.info(f"Loading existing classifier model for {self.crop}")
+                self.classifier = joblib.load(self.ml_model_path)
             else:
                 logger.info("Creating new classifier model")
                 self._create_classifier()
@@ -57,19 +116,80 @@ class CropDiseaseModel:
             logger.error(f"Error loading classifier: {e}")
             logger.info("Creating new classifier model")
             self._create_classifier()
+        
+        self.class_indices = self._class_indices()
+    
+    def _class_indices(self):
+        """
+        Map a fitted classifier's classes onto this crop's class list
+        
+        Labels are either class names or indices into the crop's classes.
+        
+        Returns:
+            np.array: Position in self.classes of each entry of classifier.classes_,
+                or None when the classifier has not been fitted
+            
+        Raises:
+            ValueError: If the classifier predicts classes this crop does not have
+        """
+        labels = getattr(self.classifier, 'classes_', None)
+        if labels is None:
+            return None
+        
+        indices = []
+        unknown = []
+        for label in labels:
+            if isinstance(label, str):
+                index = self.classes.index(label) if label in self.classes else None
+            else:
+                index = int(label) if 0 <= int(label) < len(self.classes) else None
+            if index is None:
+                unknown.append(label)
+            indices.append(index)
+        
+        if unknown:
+            raise ValueError(
+                f"Classifier at {self.ml_model_path} predicts classes {unknown} "
+                f"that are not in the {self.crop} classes {self.classes}"
+            )
+        return np.array(indices, dtype=np.intp)
+    
+    def _migrate_legacy_models(self):
+        """
+        Move models saved before per-crop directories into the default crop's directory
+        
+        Earlier versions kept a single model directly in MODEL_DIRECTORY; it
+        was trained on the default crop's classes.
+        """
+        for filename, path in ((PCA_MODEL_FILENAME, self.pca_model_path),
+                               (ML_MODEL_FILENAME, self.ml_model_path)):
+            legacy_path = os.path.join(MODEL_DIRECTORY, filename)
+            if os.path.exists(path) or not os.path.exists(legacy_path):
+                continue
+            try:
+                os.replace(legacy_path, path)
+                logger.info(f"Moved legacy model {legacy_path} to {path}")
+            except FileNotFoundError:
+                pass  # Moved by another process in the meantime
     
     def _create_pca(self):
         """Create and save the PCA feature extractor"""
+        import joblib
+        from sklearn.decomposition import PCA
+        
         # Create a PCA model for feature extraction
         self.pca = PCA(n_components=50)
         
         # Since we don't have real training data to fit the PCA, we'll save as-is
         # In a real scenario, we would fit this with training data first
-        joblib.dump(self.pca, PCA_MODEL_PATH)
+        joblib.dump(self.pca, self.pca_model_path)
         logger.info("PCA feature extractor created and saved")
     
     def _create_classifier(self):
         """Create and save the ML classifier model"""
+        import joblib
+        from sklearn.ensemble import RandomForestClassifier
+        
         # Create a random forest classifier (default model)
         # In a real scenario, this would be trained with actual data
         self.classifier = RandomForestClassifier(
@@ -80,7 +200,7 @@ class CropDiseaseModel:
         
         # Since we don't have real training data, we'll just save the untrained model
         # In production, this would be trained before saving
-        joblib.dump(self.classifier, ML_MODEL_PATH)
+        joblib.dump(self.classifier, self.ml_model_path)
         logger.info("Classifier model created and saved")
     
     def _extract_traditional_features(self, image):
@@ -93,6 +213,8 @@ class CropDiseaseModel:
         Returns:
             np.array: Extracted features
         """
+        import cv2
+        
         features = []
         
         # 1. Resize for consistency
@@ -156,33 +278,308 @@ class CropDiseaseModel:
         Returns:
             tuple: (predicted_class, confidence)
         """
-        # Since we don't have a real trained model, this is a placeholder
-        # In production, this would use the trained classifier
+        prediction = self.predict_with_uncertainty(features)
+        return prediction["disease_class"], prediction["confidence"]
+    
+    def predict_with_uncertainty(self, features):
+        """
+        Classify the image and report the full probability vector and an
+        uncertainty score from the same inference pass
+        
+        With a fitted random forest, each tree is evaluated once: the mean of the
+        per-tree probabilities is the forest's probability vector, and the
+        uncertainty is the share of trees whose vote disagrees with the forest
+        ('vote_disagreement'). Without a fitted classifier, the uncertainty is
+        the normalized entropy of the simulated probabilities ('entropy').
         
-        # For demonstration, let's simulate a prediction
-        # This is for demonstration only - in production use the trained model's predictions
+        The probabilities are the forest's raw averaged tree outputs and are not
+        calibrated; a calibrated model would need a held-out calibration set,
+        which this project does not have yet.
         
-        # Use the feature vector to generate a deterministic but simulated result
-        # Calculate a simple hash of the features to make results consistent for the same image
-        feature_hash = int(sum(features) * 1000) % 10000
-        np.random.seed(feature_hash)
+        Args:
+            features: Features extracted from the image
+            
+        Returns:
+            dict: disease_class, confidence, probabilities (float32 array aligned
+                with self.classes), uncertainty in [0, 1] and uncertainty_method
+        """
+        trees = getattr(self.classifier, 'estimators_', None)
         
-        # Generate "probabilities" for each class
-        probabilities = np.random.rand(3)
-        probabilities = probabilities / probabilities.sum()  # Normalize to sum to 1
+        if trees:
+            X = np.asarray(features, dtype=np.float32).reshape(1, -1)
+            per_tree = np.stack([tree.predict_proba(X)[0] for tree in trees]).astype(np.float32)
+            forest = per_tree.mean(axis=0)
+            
+            # Share of trees voting for the forest's top class
+            agreement = np.mean(per_tree.argmax(axis=1) == forest.argmax())
+            uncertainty = 1.0 - float(agreement)
+            uncertainty_method = UNCERTAINTY_VOTE_DISAGREEMENT
+            
+            # Align the fitted classes with this crop's class list
+            probabilities = np.zeros(len(self.classes), dtype=np.float32)
+            probabilities[self.class_indices] = forest
+        else:
+            # Since we don't have a real trained model, this is a placeholder
+            # In production, this would use the trained classifier
+            
+            # Use the feature vector to generate a deterministic but simulated result
+            # Calculate a simple hash of the features to make results consistent for the same image
+            feature_hash = int(sum(features) * 1000) % 10000
+            
+            # Generate "probabilities" for each class; a local generator gives the
+            # same values as seeding the global one without racing other threads
+            probabilities = np.random.RandomState(feature_hash).rand(len(self.classes))
+            probabilities = probabilities / probabilities.sum()  # Normalize to sum to 1
+            
+            # Normalized entropy: 0 when one class has all the mass, 1 when uniform
+            nonzero = probabilities[probabilities > 0]
+            uncertainty = float(-(nonzero * np.log(nonzero)).sum() / np.log(len(self.classes)))
+            uncertainty_method = UNCERTAINTY_ENTROPY
         
         # Get the class with highest probability
-        predicted_class_idx = np.argmax(probabilities)
-        confidence = probabilities[predicted_class_idx]
+        predicted_class_idx = int(np.argmax(probabilities))
         
-        return CLASSES[predicted_class_idx], float(confidence)
+        return {
+            "disease_class": self.classes[predicted_class_idx],
+            "confidence": float(probabilities[predicted_class_idx]),
+            "probabilities": probabilities.astype(np.float32),
+            "uncertainty": uncertainty,
+            "uncertainty_method": uncertainty_method
+        }
+
+def top_predictions(classes, probabilities, k=TOP_K):
+    """
+    List the k most probable classes
+    
+    Args:
+        classes: Class names aligned with probabilities
+        probabilities: Probability per class
+        k: Number of classes to return
+        
+    Returns:
+        list: Dicts with class and probability, most probable first
+    """
+    probabilities = np.asarray(probabilities)
+    order = np.argsort(probabilities)[::-1][:k]
+    return [{"class": classes[i], "probability": float(probabilities[i])} for i in order]
+
+def serialize_probabilities(probabilities):
+    """Encode a probability vector compactly for storage on Analysis"""
+    return json.dumps([round(float(p), 4) for p in probabilities], separators=(',', ':'))
+
+def needs_review(confidence, uncertainty, uncertainty_method=UNCERTAINTY_VOTE_DISAGREEMENT):
+    """
+    Check whether a prediction should be routed to human review
+    
+    Args:
+        confidence: Probability of the predicted class
+        uncertainty: Uncertainty score in [0, 1]
+        uncertainty_method: Measure the uncertainty was computed with, which
+            selects its threshold from REVIEW_UNCERTAINTY_THRESHOLDS
+        
+    Returns:
+        bool: True if the prediction should be reviewed
+    """
+    if confidence is not None and confidence < REVIEW_CONFIDENCE_THRESHOLD:
+        return True
+    threshold = REVIEW_UNCERTAINTY_THRESHOLDS.get(uncertainty_method or UNCERTAINTY_VOTE_DISAGREEMENT,
+                                                  REVIEW_UNCERTAINTY_THRESHOLD)
+    if uncertainty is not None and uncertainty > threshold:
+        return True
+    return False
+
+class ModelRouter:
+    """
+    Routes requests to per-crop CropDiseaseModel instances.
+    
+    Pinned models (the ones preloaded before forking) are never evicted. At most
+    max_models other models are kept in memory: the least recently used one is
+    evicted before another crop is loaded, and a background thread evicts
+    models not used for idle_seconds.
+    
+    Loading happens outside the router lock, so requests for crops that are
+    already in memory never wait behind a cold load; concurrent requests for
+    the same crop share one load.
+    """
+    
+    def __init__(self, max_models=MAX_LOADED_MODELS, idle_seconds=MODEL_IDLE_SECONDS):
+        """Initialize an empty router"""
+        if max_models < 1:
+            raise ValueError("max_models must be at least 1")
+        
+        self.max_models = max_models
+        self.idle_seconds = idle_seconds
+        self._pinned = {}  # crop -> model
+        self._models = OrderedDict()  # crop -> (model, last used time)
+        self._loading = {}  # crop -> Future resolving to the model
+        self._lock = threading.Lock()
+        self._reaper_pid = None
+    
+    def get(self, crop=DEFAULT_CROP):
+        """
+        Get the model for a crop, loading it if needed
+        
+        Args:
+            crop: Crop name, one of CROP_CLASSES
+            
+        Returns:
+            CropDiseaseModel: The crop's model
+        """
+        return self._load(crop, pin=False)
+    
+    def pin(self, crop):
+        """
+        Load a crop's model and keep it in memory permanently
+        
+        Pinning never starts the idle-eviction thread, so it is safe to call
+        in a process that forks afterwards.
+        
+        Args:
+            crop: Crop name, one of CROP_CLASSES
+            
+        Returns:
+            CropDiseaseModel: The crop's model
+        """
+        return self._load(crop, pin=True)
+    
+    def _load(self, crop, pin):
+        """
+        Return a crop's model from memory, or load it once outside the lock
+        
+        Args:
+            crop: Crop name, one of CROP_CLASSES
+            pin: Keep the model permanently instead of in the LRU
+            
+        Returns:
+            CropDiseaseModel: The crop's model
+        """
+        if crop not in CROP_CLASSES:
+            raise ValueError(f"Unsupported crop: {crop}")
+        
+        with self._lock:
+            if crop in self._pinned:
+                return self._pinned[crop]
+            
+            if crop in self._models:
+                if pin:
+                    model, _ = self._models.pop(crop)
+                    self._pinned[crop] = model
+                    return model
+                model, _ = self._models[crop]
+                self._models[crop] = (model, time.monotonic())
+                self._models.move_to_end(crop)
+                cached = model
+            else:
+                cached = None
+                pending = self._loading.get(crop)
+                is_loader = pending is None
+                if is_loader:
+                    pending = Future()
+                    self._loading[crop] = pending
+                    
+                    # Evict before loading so memory never holds more than max_models
+                    # unpinned models, counting the ones being loaded
+                    while not pin and self._models and len(self._models) + len(self._loading) > self.max_models:
+                        evicted, _ = self._models.popitem(last=False)
+                        logger.info(f"Evicted least recently used model: {evicted}")
+        
+        if cached is not None:
+            self._ensure_reaper()
+            return cached
+        
+        if not is_loader:
+            model = pending.result()
+            if pin:
+                with self._lock:
+                    self._models.pop(crop, None)
+                    self._pinned[crop] = model
+            return model
+        
+        try:
+            logger.info(f"Loading model for crop: {crop}")
+            model = CropDiseaseModel(crop)
+        except Exception as e:
+            with self._lock:
+                del self._loading[crop]
+            pending.set_exception(e)
+            raise
+        
+        with self._lock:
+            del self._loading[crop]
+            if pin:
+                self._pinned[crop] = model
+            else:
+                self._models[crop] = (model, time.monotonic())
+        pending.set_result(model)
+        
+        # Only unpinned models can go idle, so the thread starts with the first one
+        if not pin:
+            self._ensure_reaper()
+        
+        return model
+    
+    def _ensure_reaper(self):
+        """Start the idle-eviction thread once per process"""
+        if not self.idle_seconds or self._reaper_pid == os.getpid():
+            return
+        
+        # Threads do not survive fork, so each worker process starts its own
+        with self._lock:
+            if self._reaper_pid == os.getpid():
+                return
+            self._reaper_pid = os.getpid()
+        
+        interval = min(self.idle_seconds, 60.0)
+        
+        def reap():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+        
+        threading.Thread(target=reap, name="model-idle-reaper", daemon=True).start()
+    
+    def evict_idle(self):
+        """Drop unpinned models that have not been used for idle_seconds"""
+        if not self.idle_seconds:
+            return
+        
+        with self._lock:
+            now = time.monotonic()
+            for crop, (_, last_used) in list(self._models.items()):
+                if now - last_used > self.idle_seconds:
+                    del self._models[crop]
+                    logger.info(f"Evicted idle model: {crop}")
+    
+    def loaded_crops(self):
+        """List the crops with a model in memory, pinned first, then least recently used first"""
+        with self._lock:
+            return list(self._pinned) + list(self._models)
 
 # Singleton instance
-_model_instance = None
-
-def get_model():
-    """Get or create the model singleton instance"""
-    global _model_instance
-    if _model_instance is None:
-        _model_instance = CropDiseaseModel()
-    return _model_instance
+_router_instance = None
+
+def get_router():
+    """Get or create the model router singleton instance"""
+    global _router_instance
+    if _router_instance is None:
+        _router_instance = ModelRouter()
+    return _router_instance
+
+def get_model(crop=DEFAULT_CROP):
+    """Get the model for a crop from the router"""
+    return get_router().get(crop)
+
+def preload_models(crops):
+    """Load and pin the models for the given crops, e.g. before forking workers"""
+    router = get_router()
+    for crop in crops:
+        router.pin(crop)
+
+def models_ready():
+    """
+    Check whether this process can serve predictions without a cold load
+    
+    Ready when the preloaded (pinned) models are in memory; a process that
+    preloaded nothing is ready once any model has been loaded.
+    """
+    return _router_instance is not None and bool(_router_instance.loaded_crops())
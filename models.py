@@ -9,13 +9,20 @@ class Analysis(db.Model):
     filename = db.Column(db.String(255), nullable=False)
     original_image_path = db.Column(db.String(512), nullable=False)
     processed_image_path = db.Column(db.String(512), nullable=True)
+    crop = db.Column(db.String(50), nullable=True, index=True)
     disease_class = db.Column(db.String(100), nullable=True)
     confidence = db.Column(db.Float, nullable=True)
+    probabilities = db.Column(db.Text, nullable=True)  # JSON list aligned with the crop's classes
+    uncertainty = db.Column(db.Float, nullable=True)
+    uncertainty_method = db.Column(db.String(32), nullable=True)  # 'vote_disagreement' or 'entropy'
+    lesion_count = db.Column(db.Integer, nullable=True)
+    affected_area_percent = db.Column(db.Float, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Additional metadata fields
     features = db.Column(db.Text, nullable=True)  # JSON string of extracted features
     preprocessing_details = db.Column(db.Text, nullable=True)  # JSON string of preprocessing steps
+    regions = db.Column(db.Text, nullable=True)  # Compact JSON of per-lesion features
     
     def __repr__(self):
         return f"<Analysis {self.id}: {self.filename} - {self.disease_class}>"
@@ -27,9 +34,16 @@ class Analysis(db.Model):
         return {
             'id': self.id,
             'filename': self.filename,
+            'crop': self.crop,
             'disease_class': self.disease_class,
             'confidence': self.confidence,
+            'probabilities': self.probabilities,
+            'uncertainty': self.uncertainty,
+            'uncertainty_method': self.uncertainty_method,
+            'lesion_count': self.lesion_count,
+            'affected_area_percent': self.affected_area_percent,
             'created_at': self.created_at.isoformat(),
             'features': self.features,
-            'preprocessing_details': self.preprocessing_details
+            'preprocessing_details': self.preprocessing_details,
+            'regions': self.regions
         }
@@ -1,39 +1,84 @@
 import os
-import cv2
 import json
 import logging
-import numpy as np
 from flask import request, jsonify, send_file
+from sqlalchemy import text
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from backend.app import db
 from backend.models import Analysis
-from backend.ml_model import get_model
-from backend.image_processing import ImageProcessor
 from backend.utils import generate_unique_filename, save_image_to_disk, format_json_response
 
 logger = logging.getLogger(__name__)
 
 # Constants
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
-PROCESSED_FOLDER = os.path.join(os.path.dirname(__file__), 'processed')
+UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", os.path.join(os.path.dirname(__file__), 'uploads'))
+PROCESSED_FOLDER = os.environ.get("PROCESSED_FOLDER", os.path.join(os.path.dirname(__file__), 'processed'))
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
-# Create necessary directories
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(PROCESSED_FOLDER, exist_ok=True)
-
 def allowed_file(filename):
     """Check if file has an allowed extension"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def register_routes(app):
-    """Register API routes with the Flask app"""
+    """
+    Register API routes with the Flask app
+    
+    The image processing and ML modules are imported inside the handlers that
+    need them, so lightweight endpoints such as /api/health and /api/history
+    work without loading OpenCV, scikit-image or scikit-learn.
+    """
+    
+    # Create necessary directories
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(PROCESSED_FOLDER, exist_ok=True)
     
     @app.route('/api/health', methods=['GET'])
     def health_check():
         """Health check endpoint"""
         return jsonify({"status": "healthy", "message": "API is running"}), 200
     
+    @app.route('/api/ready', methods=['GET'])
+    def readiness_check():
+        """
+        Readiness check endpoint
+        
+        Reports ready only once the preloaded models (or, without preloading, any
+        model) are in memory and the database is reachable, so load balancers
+        can hold traffic until a worker can serve uploads.
+        """
+        from backend.ml_model import models_ready
+        
+        checks = {"model_loaded": models_ready(), "database": False}
+        
+        try:
+            db.session.execute(text("SELECT 1"))
+            checks["database"] = True
+        except Exception as e:
+            logger.error(f"Readiness database check failed: {str(e)}")
+        
+        if all(checks.values()):
+            return jsonify({"status": "ready", "checks": checks}), 200
+        return jsonify({"status": "not ready", "checks": checks}), 503
+    
+    @app.route('/api/crops', methods=['GET'])
+    def get_crops():
+        """
+        List supported crops and the classes each crop's model predicts
+        
+        Response:
+            - JSON with crops, default crop and currently loaded models
+        """
+        from backend.ml_model import get_router, CROP_CLASSES, DEFAULT_CROP
+        
+        result = {
+            "crops": CROP_CLASSES,
+            "default_crop": DEFAULT_CROP,
+            "loaded": get_router().loaded_crops()
+        }
+        
+        return jsonify(format_json_response(result)), 200
+    
     @app.route('/api/upload', methods=['POST'])
     def upload_image():
         """
@@ -41,10 +86,17 @@ def register_routes(app):
         
         Request:
             - file: Image file
+            - crop: Crop name selecting the model (optional, defaults to DEFAULT_CROP)
             
         Response:
             - JSON with analysis results
         """
+        import cv2
+        from backend.ml_model import (
+            get_model, top_predictions, needs_review, serialize_probabilities, CROP_CLASSES, DEFAULT_CROP
+        )
+        from backend.image_processing import ImageProcessor
+        
         try:
             logger.debug("Processing image upload request")
             
@@ -77,6 +129,16 @@ def register_routes(app):
                     message=f"File type not allowed. Please upload {', '.join(ALLOWED_EXTENSIONS)}"
                 )), 400
             
+            # Check if crop is supported
+            crop = request.form.get('crop', DEFAULT_CROP).strip().lower()
+            if crop not in CROP_CLASSES:
+                logger.warning(f"Unsupported crop: {crop}")
+                return jsonify(format_json_response(
+                    None, 
+                    status="error", 
+                    message=f"Unsupported crop: {crop}. Supported crops: {', '.join(CROP_CLASSES)}"
+                )), 400
+            
             # Generate unique filename
             filename = secure_filename(file.filename)
             unique_filename = generate_unique_filename(filename)
@@ -100,6 +162,7 @@ def register_routes(app):
             processor = ImageProcessor()
             processed_data = processor.preprocess_image(image)
             processed_image = processed_data["processed_image"]
+            regions = processed_data["regions"]
             
             # Save processed image
             processed_filename = f"processed_{unique_filename}"
@@ -108,21 +171,30 @@ def register_routes(app):
             logger.debug(f"Processed image saved: {processed_path}")
             
             # Extract features using ResNet
-            model = get_model()
+            model = get_model(crop)
             features = model.extract_features(processed_image)
             
-            # Make prediction
-            disease_class, confidence = model.predict(features)
+            # Make prediction, with probabilities and uncertainty from the same pass
+            prediction = model.predict_with_uncertainty(features)
+            disease_class = prediction["disease_class"]
+            confidence = prediction["confidence"]
             
             # Create entry in database
             analysis = Analysis(
                 filename=filename,
                 original_image_path=file_path,
                 processed_image_path=processed_path,
+                crop=crop,
                 disease_class=disease_class,
                 confidence=confidence,
+                probabilities=serialize_probabilities(prediction["probabilities"]),
+                uncertainty=prediction["uncertainty"],
+                uncertainty_method=prediction["uncertainty_method"],
+                lesion_count=regions["lesion_count"],
+                affected_area_percent=regions["affected_area_percent"],
                 features=json.dumps(features.tolist()),
-                preprocessing_details=json.dumps(processed_data["processing_details"])
+                preprocessing_details=json.dumps(processed_data["processing_details"]),
+                regions=json.dumps(regions, separators=(',', ':'))
             )
             
             db.session.add(analysis)
@@ -137,15 +209,28 @@ def register_routes(app):
             result = {
                 "id": analysis.id,
                 "filename": filename,
+                "crop": crop,
                 "disease_class": disease_class,
                 "confidence": confidence,
+                "top_predictions": top_predictions(model.classes, prediction["probabilities"]),
+                "uncertainty": prediction["uncertainty"],
+                "uncertainty_method": prediction["uncertainty_method"],
+                "needs_review": needs_review(confidence, prediction["uncertainty"], prediction["uncertainty_method"]),
                 "original_image": original_base64,
                 "processed_image": processed_base64,
-                "processing_steps": processed_data["processing_details"]
+                "processing_steps": processed_data["processing_details"],
+                "region_analysis": regions
             }
             
             return jsonify(format_json_response(result)), 200
             
+        except RequestEntityTooLarge:
+            logger.warning("Upload rejected: request body too large")
+            return jsonify(format_json_response(
+                None, 
+                status="error", 
+                message=f"File too large. Maximum upload size is {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)}MB"
+            )), 413
         except Exception as e:
             logger.error(f"Error processing upload: {str(e)}")
             return jsonify(format_json_response(
@@ -162,6 +247,10 @@ def register_routes(app):
         Response:
             - JSON with analysis details
         """
+        import cv2
+        from backend.image_processing import ImageProcessor
+        from backend.ml_model import top_predictions, needs_review, CROP_CLASSES, DEFAULT_CROP
+        
         try:
             analysis = Analysis.query.get(analysis_id)
             
@@ -188,16 +277,30 @@ def register_routes(app):
             original_base64 = processor.image_to_base64(original_image)
             processed_base64 = processor.image_to_base64(processed_image)
             
+            # Rebuild class probabilities from the stored vector
+            classes = CROP_CLASSES.get(analysis.crop or DEFAULT_CROP, [])
+            probabilities = json.loads(analysis.probabilities) if analysis.probabilities else None
+            if probabilities is not None and len(probabilities) != len(classes):
+                logger.warning(f"Stored probabilities do not match classes for analysis {analysis_id}")
+                probabilities = None
+            
             # Prepare response
             result = {
                 "id": analysis.id,
                 "filename": analysis.filename,
+                "crop": analysis.crop,
                 "disease_class": analysis.disease_class,
                 "confidence": analysis.confidence,
+                "probabilities": dict(zip(classes, probabilities)) if probabilities else None,
+                "top_predictions": top_predictions(classes, probabilities) if probabilities else None,
+                "uncertainty": analysis.uncertainty,
+                "uncertainty_method": analysis.uncertainty_method,
+                "needs_review": needs_review(analysis.confidence, analysis.uncertainty, analysis.uncertainty_method),
                 "created_at": analysis.created_at.isoformat(),
                 "original_image": original_base64,
                 "processed_image": processed_base64,
-                "processing_details": json.loads(analysis.preprocessing_details) if analysis.preprocessing_details else None
+                "processing_details": json.loads(analysis.preprocessing_details) if analysis.preprocessing_details else None,
+                "region_analysis": json.loads(analysis.regions) if analysis.regions else None
             }
             
             return jsonify(format_json_response(result)), 200
@@ -215,19 +318,31 @@ def register_routes(app):
         """
         Get history of all analyses
         
+        Request:
+            - crop: Only return analyses for this crop (optional query parameter)
+        
         Response:
             - JSON list of all analyses
         """
         try:
-            analyses = Analysis.query.order_by(Analysis.created_at.desc()).all()
+            query = Analysis.query
+            
+            crop = request.args.get('crop')
+            if crop:
+                query = query.filter_by(crop=crop.strip().lower())
+            
+            analyses = query.order_by(Analysis.created_at.desc()).all()
             
             results = []
             for analysis in analyses:
                 results.append({
                     "id": analysis.id,
                     "filename": analysis.filename,
+                    "crop": analysis.crop,
                     "disease_class": analysis.disease_class,
                     "confidence": analysis.confidence,
+                    "lesion_count": analysis.lesion_count,
+                    "affected_area_percent": analysis.affected_area_percent,
                     "created_at": analysis.created_at.isoformat()
                 })
             
@@ -267,10 +382,15 @@ def register_routes(app):
                 report_data = {
                     "id": analysis.id,
                     "filename": analysis.filename,
+                    "crop": analysis.crop,
                     "disease_class": analysis.disease_class,
                     "confidence": analysis.confidence,
+                    "probabilities": json.loads(analysis.probabilities) if analysis.probabilities else None,
+                    "uncertainty": analysis.uncertainty,
+                    "uncertainty_method": analysis.uncertainty_method,
                     "created_at": analysis.created_at.isoformat(),
                     "preprocessing_details": json.loads(analysis.preprocessing_details) if analysis.preprocessing_details else None,
+                    "region_analysis": json.loads(analysis.regions) if analysis.regions else None,
                     "features": json.loads(analysis.features) if analysis.features else None
                 }
                 
@@ -0,0 +1,229 @@
+import threading
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Constants
+FCM_CLUSTERS = 3
+FCM_FUZZINESS = 2.0
+FCM_MAX_ITER = 100
+FCM_TOLERANCE = 1e-4
+FCM_MAX_SAMPLES = 20000
+FCM_CHUNK_SIZE = 262144
+EPSILON = 1e-10
+
+# Smallest spread of the first feature (intensity, scaled to 0-1) between the
+# darkest and brightest centroid for a fit to count as non-degenerate; about
+# 5 grey levels
+FCM_MIN_INTENSITY_SPREAD = 0.02
+
+class FuzzyCMeans:
+    """
+    Fuzzy C-Means clustering over per-pixel feature vectors.
+
+    Fitting is fully vectorized NumPy with a float32 membership matrix and
+    stops early once the centroids converge. Large images are fitted on a
+    random pixel subsample and then assigned in full, and centroids from the
+    previous image are reused as the starting point for the next one.
+
+    An instance can be shared between threads: fit() returns its centroids
+    for the caller to pass to predict(), and only the warm-start state is
+    kept on the instance, guarded by a lock.
+
+    Degenerate fits, where the centroids collapse together (e.g. a uniform
+    black or overexposed frame), are never kept for warm-starting: identical
+    centroids stay identical under the FCM update, so reusing them would
+    collapse every later image too.
+    """
+
+    def __init__(self, n_clusters=FCM_CLUSTERS, m=FCM_FUZZINESS, max_iter=FCM_MAX_ITER,
+                 tol=FCM_TOLERANCE, max_samples=FCM_MAX_SAMPLES, warm_start=True, random_state=42):
+        """Initialize the clustering parameters"""
+        if n_clusters < 2:
+            raise ValueError("n_clusters must be at least 2")
+        if m <= 1.0:
+            raise ValueError("Fuzziness m must be greater than 1")
+
+        self.n_clusters = n_clusters
+        self.m = m
+        self.max_iter = max_iter
+        self.tol = tol
+        self.max_samples = max_samples
+        self.warm_start = warm_start
+        self.random_state = random_state
+
+        self.centroids = None
+        self.n_iter = 0
+        self._lock = threading.Lock()
+
+    def _initial_centroids(self, X):
+        """
+        Pick starting centroids, reusing the previous fit when warm-starting
+
+        Args:
+            X: Feature matrix of shape (n_pixels, n_features)
+
+        Returns:
+            np.array: Centroids of shape (n_clusters, n_features)
+        """
+        with self._lock:
+            previous = self.centroids
+
+        if (self.warm_start and previous is not None
+                and previous.shape == (self.n_clusters, X.shape[1])
+                and not self._is_degenerate(previous)):
+            return previous.copy()
+
+        # Spread the starting centroids over the intensity quantiles so the
+        # initialisation is deterministic for a given image
+        order = np.argsort(X[:, 0], kind='stable')
+        positions = ((np.arange(self.n_clusters) + 0.5) / self.n_clusters * (len(X) - 1)).astype(np.intp)
+        return X[order[positions]].astype(np.float32)
+
+    @staticmethod
+    def _is_degenerate(centroids):
+        """Check whether the centroids have collapsed onto one intensity"""
+        return np.ptp(centroids[:, 0]) < FCM_MIN_INTENSITY_SPREAD
+
+    def _squared_distances(self, X, centroids):
+        """
+        Compute squared Euclidean distances between pixels and centroids
+
+        Args:
+            X: Feature matrix of shape (n_pixels, n_features)
+            centroids: Centroids of shape (n_clusters, n_features)
+
+        Returns:
+            np.array: float32 distances of shape (n_pixels, n_clusters)
+        """
+        distances = np.einsum('ij,ij->i', X, X)[:, None] - 2.0 * (X @ centroids.T)
+        distances += np.einsum('ij,ij->i', centroids, centroids)[None, :]
+        np.maximum(distances, EPSILON, out=distances)
+        return distances
+
+    def _memberships(self, distances):
+        """
+        Convert squared distances into fuzzy memberships
+
+        Args:
+            distances: float32 squared distances of shape (n_pixels, n_clusters)
+
+        Returns:
+            np.array: float32 membership matrix whose rows sum to 1
+        """
+        # u_ik = 1 / sum_j (d_ik / d_ij) ** (2 / (m - 1)); distances are
+        # already squared, so the exponent is 1 / (m - 1)
+        membership = np.power(distances, -1.0 / (self.m - 1.0), dtype=np.float32)
+        membership /= membership.sum(axis=1, keepdims=True)
+        return membership
+
+    def fit(self, X):
+        """
+        Fit the centroids to a feature matrix
+
+        Args:
+            X: Feature matrix of shape (n_pixels, n_features)
+
+        Returns:
+            np.array: Fitted centroids of shape (n_clusters, n_features),
+                ordered by the first feature
+        """
+        X = np.asarray(X, dtype=np.float32)
+
+        # Fit on a subsample of the pixels to bound the cost on large images
+        if self.max_samples and len(X) > self.max_samples:
+            rng = np.random.default_rng(self.random_state)
+            X = X[rng.choice(len(X), self.max_samples, replace=False)]
+
+        centroids = self._initial_centroids(X)
+
+        for iteration in range(1, self.max_iter + 1):
+            membership = self._memberships(self._squared_distances(X, centroids))
+            weights = membership ** self.m
+
+            new_centroids = (weights.T @ X) / np.maximum(weights.sum(axis=0), EPSILON)[:, None]
+            shift = np.abs(new_centroids - centroids).max()
+            centroids = new_centroids.astype(np.float32)
+
+            if shift < self.tol:
+                break
+
+        # Order clusters by the first feature so labels are stable between images
+        centroids = centroids[np.argsort(centroids[:, 0], kind='stable')]
+        with self._lock:
+            if not self._is_degenerate(centroids):
+                self.centroids = centroids
+            self.n_iter = iteration
+        logger.debug(f"FCM converged after {iteration} iterations")
+
+        return centroids
+
+    def _resolve_centroids(self, centroids):
+        """Use the given centroids, or the most recent fit if none are given"""
+        if centroids is None:
+            with self._lock:
+                centroids = self.centroids
+        if centroids is None:
+            raise ValueError("FuzzyCMeans has not been fitted")
+        return centroids
+
+    def predict_membership(self, X, centroids=None):
+        """
+        Compute the fuzzy membership matrix for every pixel
+
+        Args:
+            X: Feature matrix of shape (n_pixels, n_features)
+            centroids: Centroids returned by fit(); defaults to the most recent fit
+
+        Returns:
+            np.array: float32 membership matrix of shape (n_pixels, n_clusters)
+        """
+        X = np.asarray(X, dtype=np.float32)
+        centroids = self._resolve_centroids(centroids)
+        membership = np.empty((len(X), self.n_clusters), dtype=np.float32)
+        for start in range(0, len(X), FCM_CHUNK_SIZE):
+            stop = start + FCM_CHUNK_SIZE
+            membership[start:stop] = self._memberships(self._squared_distances(X[start:stop], centroids))
+        return membership
+
+    def predict(self, X, centroids=None):
+        """
+        Assign every pixel to the cluster with the highest membership
+
+        Args:
+            X: Feature matrix of shape (n_pixels, n_features)
+            centroids: Centroids returned by fit(); defaults to the most recent fit
+
+        Returns:
+            np.array: Cluster label per pixel
+        """
+        # The highest membership is always the nearest centroid, so the full
+        # image is labelled from distances without building the membership matrix
+        X = np.asarray(X, dtype=np.float32)
+        centroids = self._resolve_centroids(centroids)
+        labels = np.empty(len(X), dtype=np.intp)
+        for start in range(0, len(X), FCM_CHUNK_SIZE):
+            stop = start + FCM_CHUNK_SIZE
+            labels[start:stop] = self._squared_distances(X[start:stop], centroids).argmin(axis=1)
+        return labels
+
+    def fit_predict(self, X):
+        """
+        Fit the centroids and label every pixel
+
+        Returns:
+            tuple: (cluster label per pixel, centroids used for the labels)
+        """
+        centroids = self.fit(X)
+        return self.predict(X, centroids), centroids
+
+# Singleton instance
+_fcm_instance = None
+
+def get_fcm():
+    """Get or create the FCM singleton instance, shared so centroids warm-start across images"""
+    global _fcm_instance
+    if _fcm_instance is None:
+        _fcm_instance = FuzzyCMeans()
+    return _fcm_instance
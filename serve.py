@@ -0,0 +1,138 @@
+"""
+Production server for the crop detection API
+
+Runs the Flask app under gunicorn with a configurable worker/thread model.
+The app, OpenCV and the model are loaded in the master process before the
+workers fork, so all workers share those pages copy-on-write instead of each
+loading its own copy.
+
+Usage:
+    python -m backend.serve [--workers 4] [--threads 2] [--port 5000]
+
+Environment:
+    WEB_CONCURRENCY: Number of worker processes (default: CPU count)
+    WEB_THREADS: Threads per worker (default: 1)
+    PORT: Port to bind (default: 5000)
+    LOG_LEVEL: Application and server log level (default: INFO)
+    MAX_UPLOAD_MB: Maximum request body size in MB (default: 16)
+    DATABASE_URL: Database connection URL (default: sqlite:///crop_detection.db)
+    UPLOAD_FOLDER, PROCESSED_FOLDER: Where uploaded and processed images are
+        written (default: uploads/ and processed/ next to the code)
+    PRELOAD_CROPS: Comma-separated crops whose models load before forking
+        (default: the default crop)
+    MAX_LOADED_MODELS: Models kept in memory per worker (default: 4)
+    MODEL_IDLE_SECONDS: Evict models unused for this long (default: 1800)
+"""
+import os
+import sys
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+# Application created in the master process by preload()
+_app = None
+
+def preload():
+    """
+    Load the app and the heavy libraries in the master process
+
+    The image processing and ML modules import their libraries lazily, so
+    they are imported explicitly here to have them in memory before forking.
+
+    Returns:
+        Flask: The application object
+    """
+    global _app
+
+    import cv2
+    import skimage.filters
+    import skimage.segmentation
+    from backend.app import create_app, init_db
+    from backend.ml_model import preload_models, DEFAULT_CROP
+
+    _app = create_app()
+    init_db(_app)
+
+    crops = [crop.strip() for crop in os.environ.get("PRELOAD_CROPS", DEFAULT_CROP).split(',') if crop.strip()]
+    # Pinned, so LRU/idle eviction never drops the pages shared with the workers
+    preload_models(crops)
+    logger.info(f"Preloaded models for {', '.join(crops)} and OpenCV {cv2.__version__}")
+
+    return _app
+
+def post_fork(server, worker):
+    """Drop database connections inherited from the master process"""
+    from backend.app import db
+
+    with _app.app_context():
+        db.engine.dispose(close=False)
+
+def build_options(args):
+    """
+    Translate command-line arguments into gunicorn settings
+
+    Args:
+        args: Parsed command-line arguments
+
+    Returns:
+        dict: gunicorn configuration
+    """
+    return {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "threads": args.threads,
+        "worker_class": "gthread" if args.threads > 1 else "sync",
+        "preload_app": True,
+        "timeout": args.timeout,
+        "graceful_timeout": args.timeout,
+        "keepalive": 5,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests // 10,
+        "loglevel": os.environ.get("LOG_LEVEL", "INFO").lower(),
+        "accesslog": "-" if args.access_log else None,
+        "post_fork": post_fork,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the crop detection API with gunicorn")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '5000')))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count())),
+                        help="Number of worker processes")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', '1')),
+                        help="Threads per worker")
+    parser.add_argument('--timeout', type=int, default=120, help="Worker timeout in seconds")
+    parser.add_argument('--max-requests', type=int, default=1000,
+                        help="Restart a worker after this many requests (0 to disable)")
+    parser.add_argument('--access-log', action='store_true', help="Write the access log to stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        logger.error("gunicorn is required for the production server: pip install gunicorn")
+        return 1
+
+    class StandaloneApplication(BaseApplication):
+        """Embed gunicorn around an already-loaded WSGI app"""
+
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    app = preload()
+    StandaloneApplication(app, build_options(args)).run()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import sqlite3
+from backend.app import create_app, init_db
+
+LEGACY_SCHEMA = """
+CREATE TABLE analysis (
+    id INTEGER PRIMARY KEY,
+    filename VARCHAR(255) NOT NULL,
+    original_image_path VARCHAR(512) NOT NULL,
+    processed_image_path VARCHAR(512),
+    disease_class VARCHAR(100),
+    confidence FLOAT,
+    created_at DATETIME,
+    features TEXT,
+    preprocessing_details TEXT
+)
+"""
+
+def test_init_db_adds_new_columns_to_existing_table(tmp_path, monkeypatch):
+    database = tmp_path / "legacy.db"
+    with sqlite3.connect(database) as connection:
+        connection.execute(LEGACY_SCHEMA)
+        connection.execute("INSERT INTO analysis (filename, original_image_path) VALUES ('leaf.jpg', '/tmp/leaf.jpg')")
+
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{database}")
+    app = create_app()
+    init_db(app)
+    init_db(app)  # a second run finds nothing to add
+
+    with sqlite3.connect(database) as connection:
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(analysis)")}
+        indexes = {row[1] for row in connection.execute("PRAGMA index_list(analysis)")}
+        rows = connection.execute("SELECT filename, crop, lesion_count FROM analysis").fetchall()
+
+    assert {'crop', 'probabilities', 'uncertainty', 'uncertainty_method',
+            'regions', 'lesion_count', 'affected_area_percent'} <= columns
+    assert 'ix_analysis_crop' in indexes
+    assert rows == [('leaf.jpg', None, None)]
@@ -0,0 +1,144 @@
+import threading
+import time
+import pytest
+import backend.ml_model as ml_model
+from backend.ml_model import ModelRouter
+
+# The real model class, before the fake_model fixture replaces it
+CropDiseaseModel = ml_model.CropDiseaseModel
+
+class FakeModel:
+    """Stands in for CropDiseaseModel, counting loads per crop"""
+    loads = []
+    delay = 0.0
+
+    def __init__(self, crop):
+        time.sleep(self.delay)
+        FakeModel.loads.append(crop)
+        self.crop = crop
+
+@pytest.fixture(autouse=True)
+def fake_model(monkeypatch):
+    FakeModel.loads = []
+    FakeModel.delay = 0.0
+    monkeypatch.setattr(ml_model, 'CropDiseaseModel', FakeModel)
+    return FakeModel
+
+def test_pin_does_not_start_reaper():
+    router = ModelRouter(idle_seconds=60)
+    router.pin('rice')
+
+    assert router.loaded_crops() == ['rice']
+    assert router._reaper_pid is None
+
+def test_get_starts_reaper_for_unpinned_model():
+    router = ModelRouter(idle_seconds=60)
+    router.get('maize')
+
+    assert router._reaper_pid is not None
+
+def test_least_recently_used_is_evicted_before_load():
+    router = ModelRouter(max_models=2, idle_seconds=0)
+    router.pin('rice')
+    router.get('maize')
+    router.get('wheat')
+    router.get('maize')
+    router.get('tomato')
+
+    assert router.loaded_crops() == ['rice', 'maize', 'tomato']
+
+def test_idle_eviction_keeps_pinned_models():
+    router = ModelRouter(idle_seconds=60)
+    router.pin('rice')
+    router.get('maize')
+    router._models['maize'] = (router._models['maize'][0], time.monotonic() - 120)
+    router.evict_idle()
+
+    assert router.loaded_crops() == ['rice']
+
+def test_concurrent_requests_share_one_load(fake_model):
+    fake_model.delay = 0.2
+    router = ModelRouter(idle_seconds=0)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(router.get('wheat'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake_model.loads == ['wheat']
+    assert all(model is results[0] for model in results)
+
+def test_pin_after_get_moves_model_out_of_lru():
+    router = ModelRouter(max_models=1, idle_seconds=0)
+    model = router.get('maize')
+
+    assert router.pin('maize') is model
+    router.get('wheat')
+    assert router.loaded_crops() == ['maize', 'wheat']
+
+def test_unsupported_crop_is_rejected():
+    with pytest.raises(ValueError):
+        ModelRouter().get('banana')
+
+def test_legacy_models_move_into_default_crop_directory(tmp_path, monkeypatch):
+    import joblib
+    monkeypatch.setattr(ml_model, 'MODEL_DIRECTORY', str(tmp_path))
+    for filename in (ml_model.PCA_MODEL_FILENAME, ml_model.ML_MODEL_FILENAME):
+        joblib.dump({'legacy': filename}, tmp_path / filename)
+
+    model = CropDiseaseModel(ml_model.DEFAULT_CROP)
+
+    assert model.pca == {'legacy': ml_model.PCA_MODEL_FILENAME}
+    assert model.classifier == {'legacy': ml_model.ML_MODEL_FILENAME}
+    assert sorted(path.name for path in tmp_path.iterdir()) == [ml_model.DEFAULT_CROP]
+
+def test_placeholder_prediction_is_deterministic_and_leaves_global_rng_alone():
+    import numpy as np
+    model = object.__new__(CropDiseaseModel)
+    model.classes = ml_model.CROP_CLASSES['maize']
+    model.classifier = None
+    features = np.linspace(0.0, 1.0, 64)
+
+    np.random.seed(7)
+    expected_next = np.random.rand()
+    np.random.seed(7)
+    first = model.predict_with_uncertainty(features)
+    assert np.random.rand() == expected_next
+
+    # Same values as the earlier np.random.seed() + np.random.rand() placeholder
+    np.random.seed(int(sum(features) * 1000) % 10000)
+    legacy = np.random.rand(len(model.classes))
+    np.testing.assert_allclose(first["probabilities"], legacy / legacy.sum(), rtol=1e-6)
+    assert model.predict_with_uncertainty(features)["disease_class"] == first["disease_class"]
+    assert first["uncertainty_method"] == ml_model.UNCERTAINTY_ENTROPY
+
+def save_fitted_classifier(model_directory, crop, labels):
+    import joblib
+    import numpy as np
+    from sklearn.ensemble import RandomForestClassifier
+    rng = np.random.default_rng(0)
+    X = rng.random((len(labels) * 10, 4))
+    y = np.repeat(labels, 10)
+    classifier = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+    (model_directory / crop).mkdir()
+    joblib.dump(classifier, model_directory / crop / ml_model.ML_MODEL_FILENAME)
+
+def test_fitted_classes_are_aligned_with_crop_classes(tmp_path, monkeypatch):
+    import numpy as np
+    monkeypatch.setattr(ml_model, 'MODEL_DIRECTORY', str(tmp_path))
+    save_fitted_classifier(tmp_path, 'maize', ['Zinc Deficiency', 'Healthy'])
+
+    model = CropDiseaseModel('maize')
+    prediction = model.predict_with_uncertainty(np.full(4, 0.5))
+
+    assert [model.classes[i] for i in model.class_indices] == ['Healthy', 'Zinc Deficiency']
+    assert prediction["probabilities"][[1, 2, 3, 4, 5]].sum() == 0
+    assert prediction["disease_class"] in ('Healthy', 'Zinc Deficiency')
+
+def test_classifier_with_unknown_classes_fails_at_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(ml_model, 'MODEL_DIRECTORY', str(tmp_path))
+    save_fitted_classifier(tmp_path, 'maize', ['Healthy', 'Brown Spot'])
+
+    with pytest.raises(ValueError, match="Brown Spot"):
+        CropDiseaseModel('maize')
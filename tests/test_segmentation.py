@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import backend.segmentation as segmentation
+from backend.segmentation import FuzzyCMeans
+from backend.image_processing import ImageProcessor
+
+def make_leaf_image(size=128, lesions=True):
+    """Create a green leaf image, optionally with darker brown lesions"""
+    rng = np.random.default_rng(0)
+    image = np.empty((size, size, 3), dtype=np.uint8)
+    image[:] = (40, 150, 60)
+    if lesions:
+        yy, xx = np.mgrid[:size, :size]
+        for cy, cx, radius in ((30, 30, 10), (80, 90, 14), (100, 30, 8)):
+            image[(yy - cy) ** 2 + (xx - cx) ** 2 < radius ** 2] = (30, 60, 110)
+    noise = rng.normal(0, 6, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+@pytest.fixture
+def fresh_fcm(monkeypatch):
+    """Give each test its own FCM singleton so warm-start state does not leak"""
+    fcm = FuzzyCMeans()
+    monkeypatch.setattr(segmentation, '_fcm_instance', fcm)
+    return fcm
+
+def test_degenerate_fit_is_not_kept_for_warm_start():
+    fcm = FuzzyCMeans()
+    centroids = fcm.fit(np.full((500, 3), 0.47, dtype=np.float32))
+
+    assert np.ptp(centroids[:, 0]) == 0
+    assert fcm.centroids is None
+
+def test_lesions_found_after_uniform_frame(fresh_fcm):
+    uniform = np.full((64, 64, 3), 120, dtype=np.uint8)
+    uniform_result = ImageProcessor.preprocess_image(uniform, segmentation_method='fcm')
+    assert not uniform_result["mask"].any()
+
+    result = ImageProcessor.preprocess_image(make_leaf_image(), segmentation_method='fcm')
+    assert result["mask"].any()
+    assert result["regions"]["lesion_count"] == 3
+
+def test_lesion_free_leaf_has_empty_mask(fresh_fcm):
+    result = ImageProcessor.preprocess_image(make_leaf_image(lesions=False), segmentation_method='fcm')
+
+    assert not result["mask"].any()
+    assert result["regions"]["affected_area_percent"] == 0.0